@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 """
-Mac Activity Agent (frontmost: System Events → Quartz → NSWorkspace)
-- Uses System Events (most reliable) to find truly frontmost app/pid
-- Falls back to Quartz (filters overlays) then NSWorkspace
+Mac Activity Agent (frontmost: NSWorkspace → Quartz → System Events)
+- Uses NSWorkspace (in-process, no IPC) to find the frontmost app/pid
+- Falls back to Quartz (filters overlays) then System Events
 - Uses AX (Accessibility) for focused window title, falls back to Quartz title
 - Uses AppleScript to fetch URL/file path for common apps (with retry)
 - Dwell-based posting to reduce noise; optional excludes by bundle id
@@ -27,6 +27,7 @@ CONFIGURATION:
     AGENT_DISABLE_AX=0
     AGENT_MIN_DWELL_SECONDS=15
     AGENT_EXCLUDE_BUNDLES=com.apple.Terminal,com.apple.systempreferences
+    AGENT_OSA_SUBPROCESS=0   # 1 = force legacy osascript shell-outs
     MAC_AGENT_DB=~/Library/ActivityAgent/agent.sqlite3
 
 Notes:
@@ -68,10 +69,14 @@ VERBOSE            = config.get("verbose", True) if "verbose" in config else (os
 PRINT_EVERY_POLL   = config.get("print_every", False) if "print_every" in config else (os.getenv("AGENT_PRINT_EVERY", "0") == "1")
 DISABLE_AX         = config.get("disable_ax", False) if "disable_ax" in config else (os.getenv("AGENT_DISABLE_AX", "0") == "1")
 MIN_DWELL_SECONDS  = config.get("min_dwell_seconds") or int(os.getenv("AGENT_MIN_DWELL_SECONDS", "15"))
+REFRESH_DETAILS_SECONDS = config.get("refresh_details_seconds") or int(os.getenv("AGENT_REFRESH_DETAILS_SECONDS", "30"))
+IDLE_AFTER_SECONDS = config.get("idle_after_seconds") or int(os.getenv("AGENT_IDLE_AFTER_SECONDS", "60"))
 DB_PATH            = config.get("db_path") or os.getenv("MAC_AGENT_DB", os.path.expanduser("~/Library/ActivityAgent/agent.sqlite3"))
 POST_URL           = config.get("api_url") or os.getenv("AGENT_POST_URL")
 API_KEY            = config.get("api_key") or os.getenv("AGENT_API_KEY")
 EXCLUDE_BUNDLES    = set(config.get("exclude_bundles", [])) if "exclude_bundles" in config else set(b.strip() for b in os.getenv("AGENT_EXCLUDE_BUNDLES", "").split(",") if b.strip())
+IN_MEMORY_DB       = config.get("in_memory_db", False) if "in_memory_db" in config else (os.getenv("AGENT_INMEM", "0") == "1")
+SNAPSHOT_SECONDS   = config.get("snapshot_seconds") or int(os.getenv("AGENT_SNAPSHOT_SECONDS", "60"))
 
 def log(msg: str):
     if VERBOSE:
@@ -98,19 +103,53 @@ if not DISABLE_AX:
 from Quartz import (
     CGWindowListCopyWindowInfo,
     kCGWindowListOptionOnScreenOnly,
-    kCGWindowListOptionOnScreenAboveWindow,
     kCGNullWindowID,
+    CGEventSourceSecondsSinceLastEventType,
+    kCGEventSourceStateHIDSystemState,
+    kCGAnyInputEventType,
 )
 
+# OSAKit for in-process AppleScript (no osascript fork/exec per call)
+OSAKIT_AVAILABLE = False
+if os.getenv("AGENT_OSA_SUBPROCESS", "0") != "1":
+    try:
+        from OSAKit import OSAScript, OSALanguage
+        OSAKIT_AVAILABLE = True
+    except Exception:
+        OSAKIT_AVAILABLE = False
+
 # ---------- Storage ----------
 def ensure_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    # The connection is created and used only on the DB writer thread;
+    # sqlite3 connections are effectively thread-local.
+    if IN_MEMORY_DB:
+        # The server ack (posted=1) is the durability story; the local table
+        # is a recovery cache, so it can live in RAM with periodic snapshots
+        # to DB_PATH. No WAL fsyncs on the hot path at all.
+        conn = sqlite3.connect(":memory:")
+        if os.path.exists(DB_PATH):
+            disk = sqlite3.connect(DB_PATH)
+            disk.backup(conn)
+            disk.close()
+    else:
+        conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
+    # WAL + relaxed sync: commits no longer fsync the rollback journal, so
+    # the periodic batch commit is cheap. mmap + a bigger page cache keep
+    # reads off the syscall path. (Harmless no-ops for the :memory: mode.)
+    cur.executescript(
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA temp_store=MEMORY;"
+        "PRAGMA mmap_size=134217728;"   # 128 MiB
+        "PRAGMA cache_size=-20000;"     # ~20 MB page cache
+    )
     cur.execute(
         """CREATE TABLE IF NOT EXISTS raw_events (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             ts_utc TEXT NOT NULL,
+            ts_epoch INTEGER,
             app_name TEXT,
             bundle_id TEXT,
             window_title TEXT,
@@ -121,17 +160,141 @@ def ensure_db():
             posted INTEGER DEFAULT 0
         )"""
     )
+    # existing DBs predate ts_epoch; ALTER is a no-op error if it's there
+    try:
+        cur.execute("ALTER TABLE raw_events ADD COLUMN ts_epoch INTEGER")
+    except sqlite3.OperationalError:
+        pass
+    # integer epoch is indexable without parsing the ISO text column
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_raw_events_ts ON raw_events(ts_epoch)")
+    # posted confirmations key on ts_utc; without this each mark turns
+    # into a full-table scan as the local DB grows
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_raw_events_ts_utc ON raw_events(ts_utc)")
     conn.commit()
     return conn
 
+# Batched inserts: write_event appends to _PENDING; rows hit disk via a single
+# executemany + commit every FLUSH_SECONDS (or when the buffer fills), instead
+# of paying an fsync per event.
+_PENDING: list = []
+_PENDING_LOCK = threading.Lock()
+FLUSH_BATCH_SIZE = 64
+FLUSH_SECONDS = 5.0
+
+INSERT_EVENT_SQL = (
+    "INSERT INTO raw_events (ts_utc, ts_epoch, app_name, bundle_id, window_title, url, file_path, user, hostname) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# ts_utc values the server has confirmed; the flusher marks them posted=1 so
+# the reconnect replay knows what still needs to go out.
+_POSTED_TS: list = []
+
+def mark_posted(ts_list):
+    with _PENDING_LOCK:
+        _POSTED_TS.extend(ts_list)
+
+def flush_pending(conn, cur):
+    with _PENDING_LOCK:
+        if not _PENDING and not _POSTED_TS:
+            return
+        rows = _PENDING[:]
+        _PENDING.clear()
+        posted = _POSTED_TS[:]
+        _POSTED_TS.clear()
+        # one transaction (and one journal sync) for the whole batch
+        with conn:
+            if rows:
+                cur.executemany(INSERT_EVENT_SQL, rows)
+            if posted:
+                cur.executemany("UPDATE raw_events SET posted=1 WHERE ts_utc=?", [(ts,) for ts in posted])
+
+# The writer thread owns the sqlite connection outright: the poll loop only
+# ever appends to _PENDING, so a slow fsync overlaps the next frontmost RPC
+# instead of delaying the poll cadence.
+_DB_WAKE = threading.Event()
+_DB_STOP = threading.Event()
+_DB_THREAD: Optional[threading.Thread] = None
+
+def snapshot_to_disk(conn):
+    """Persist the in-memory DB to DB_PATH (only used when IN_MEMORY_DB)."""
+    disk = sqlite3.connect(DB_PATH)
+    try:
+        conn.backup(disk)
+    finally:
+        disk.close()
+
+def start_db_writer():
+    global _DB_THREAD
+    def _run():
+        conn = ensure_db()
+        cur = conn.cursor()
+        last_snapshot = time.time()
+        while not _DB_STOP.is_set():
+            _DB_WAKE.wait(FLUSH_SECONDS)
+            _DB_WAKE.clear()
+            try:
+                flush_pending(conn, cur)
+                if IN_MEMORY_DB and (time.time() - last_snapshot) >= SNAPSHOT_SECONDS:
+                    snapshot_to_disk(conn)
+                    last_snapshot = time.time()
+            except Exception as e:
+                log(f"[FLUSH ERROR] {e}")
+        try:
+            flush_pending(conn, cur)
+            if IN_MEMORY_DB:
+                snapshot_to_disk(conn)
+            conn.close()
+        except Exception as e:
+            log(f"[FLUSH ERROR] {e}")
+    _DB_THREAD = threading.Thread(target=_run, daemon=True)
+    _DB_THREAD.start()
+
+def stop_db_writer(timeout: float = 5.0):
+    """Signal the writer to do a final flush and wait for it (bounded)."""
+    _DB_STOP.set()
+    _DB_WAKE.set()
+    if _DB_THREAD is not None:
+        _DB_THREAD.join(timeout)
+
 # ---------- AppleScript helpers ----------
-def osa(script: str) -> str:
+# Compiled-script cache: each AppleScript source is compiled exactly once into
+# an OSAScript and reused, instead of paying fork/exec + osascript startup +
+# AppleScript recompile on every poll.
+_SCRIPT_CACHE: Dict[str, "OSAScript"] = {}
+
+def run_osa(script: str) -> str:
+    """Execute AppleScript in-process via OSAKit, compiling (and caching) once."""
+    s = _SCRIPT_CACHE.get(script)
+    if s is None:
+        s = OSAScript.alloc().initWithSource_language_(
+            script, OSALanguage.languageForName_("AppleScript")
+        )
+        ok, err = s.compileAndReturnError_(None)
+        if not ok:
+            log(f"[WARN] AppleScript compile failed: {err}")
+            return ""
+        _SCRIPT_CACHE[script] = s
+    try:
+        result, err = s.executeAndReturnError_(None)
+        if result is None:
+            return ""
+        return str(result.stringValue() or "").strip()
+    except Exception:
+        return ""
+
+def _osa_subprocess(script: str) -> str:
     try:
         out = subprocess.check_output(["osascript", "-e", script], text=True, stderr=subprocess.DEVNULL).strip()
         return out
     except Exception:
         return ""
 
+def osa(script: str) -> str:
+    if OSAKIT_AVAILABLE:
+        return run_osa(script)
+    return _osa_subprocess(script)
+
 def osa_retry(script: str, tries: int = 2, delay: float = 0.15) -> str:
     """Run AppleScript with one quick retry (helps during active window switches)."""
     for _ in range(tries):
@@ -141,16 +304,69 @@ def osa_retry(script: str, tries: int = 2, delay: float = 0.15) -> str:
         time.sleep(delay)
     return ""
 
+# ---------- AppleScript sources (module-level so each compiles once) ----------
+# NOTE: deliberately avoids "first process whose frontmost is true" — the
+# compound whose-clause takes a pathologically slow path in System Events
+# (multi-second stalls). A plain repeat + early exit stays fast.
+SCRIPT_SYSTEM_EVENTS_FRONTMOST = (
+    'tell application "System Events" to try\n'
+    'repeat with p in application processes\n'
+    'if frontmost of p then\n'
+    'return (name of p as text) & "|" & (unix id of p as text)\n'
+    'end if\n'
+    'end repeat\n'
+    'return ""\n'
+    'on error\nreturn ""\nend try'
+)
+
+SCRIPT_SAFARI_URL = (
+    'tell application "Safari" to try\n'
+    'set u to URL of current tab of front window\n'
+    'return u\non error\nreturn ""\nend try'
+)
+
+SCRIPT_CHROME_URL = (
+    'tell application "Google Chrome" to try\n'
+    'set u to URL of active tab of front window\n'
+    'return u\non error\nreturn ""\nend try'
+)
+
+SCRIPT_BRAVE_URL = (
+    'tell application "Brave Browser" to try\n'
+    'set u to URL of active tab of front window\n'
+    'return u\non error\nreturn ""\nend try'
+)
+
+SCRIPT_PREVIEW_PATH = (
+    'tell application "Preview" to try\n'
+    'set theDoc to document 1\n'
+    'set p to path of theDoc\n'
+    'POSIX path of p\n'
+    'on error\nreturn ""\nend try'
+)
+
+SCRIPT_EXCEL_PATH = (
+    'tell application "Microsoft Excel" to try\n'
+    'if not (exists active workbook) then return ""\n'
+    'set p to (full name of active workbook)\n'
+    'return POSIX path of p\n'
+    'on error\nreturn ""\nend try'
+)
+
+SCRIPT_SUBLIME_PATH = (
+    'tell application "Sublime Text" to try\n'
+    'if not (exists window 1) then return ""\n'
+    'set theDoc to document of window 1\n'
+    'if theDoc is missing value then return ""\n'
+    'set p to (path of theDoc)\n'
+    'return POSIX path of p\n'
+    'on error\nreturn ""\nend try'
+)
+
 # 1) PRIMARY: System Events (most reliable frontmost)
 def get_frontmost_via_system_events() -> Optional[Tuple[str, int]]:
     # returns (process_name, pid) or None
-    s = (
-        'tell application "System Events" to try\n'
-        'set p to first process whose frontmost is true\n'
-        'return (name of p as text) & "|" & (unix id of p as text)\n'
-        'on error\nreturn ""\nend try'
-    )
-    out = osa(s)
+    out = osa(SCRIPT_SYSTEM_EVENTS_FRONTMOST)
     if "|" in out:
         name, pid = out.split("|", 1)
         try:
@@ -160,39 +376,41 @@ def get_frontmost_via_system_events() -> Optional[Tuple[str, int]]:
     return None
 
 # 2) FALLBACK: Quartz (filter overlays & weird layers)
-_OVERLAY_OWNERS = {
+_OVERLAY_OWNERS = frozenset({
     "Window Server", "Control Center", "Notification Center", "Dock",
     "Spotlight", "ScreenSaverEngine", "PowerChime", "Creative Cloud",
     "Adobe CEF Helper", "Adobe Desktop Service"
-}
+})
 def get_frontmost_via_quartz() -> Optional[Tuple[str, int, Optional[str]]]:
     """
     Returns (owner_name, pid, quartz_window_title) for the best candidate.
     We filter to layer 0 (normal windows), visible, non-overlay owners.
     """
     try:
-        opts = kCGWindowListOptionOnScreenOnly | kCGWindowListOptionOnScreenAboveWindow
-        info = CGWindowListCopyWindowInfo(opts, kCGNullWindowID) or []
+        # On-screen only: the above-window option expands the result set and
+        # every extra entry is another dict crossing the ObjC->Python bridge.
+        info = CGWindowListCopyWindowInfo(kCGWindowListOptionOnScreenOnly, kCGNullWindowID) or []
         if not info:
             return None
 
-        # pick first "normal" window
+        # hoist keys/sets into locals for the tight scan
+        owner_key, layer_key, alpha_key = "kCGWindowOwnerName", "kCGWindowLayer", "kCGWindowAlpha"
+        pid_key, name_key = "kCGWindowOwnerPID", "kCGWindowName"
+        overlays = _OVERLAY_OWNERS
+
+        # pick first "normal" window (list is front-to-back; short-circuit)
         for w in info:
-            owner = w.get("kCGWindowOwnerName") or ""
-            if owner in _OVERLAY_OWNERS:
+            owner = w.get(owner_key) or ""
+            if owner in overlays:
                 continue
-            layer = int(w.get("kCGWindowLayer") or 0)
-            if layer != 0:
+            if int(w.get(layer_key) or 0) != 0:
                 continue
-            alpha = float(w.get("kCGWindowAlpha") or 1.0)
-            if alpha <= 0.01:
+            if float(w.get(alpha_key) or 1.0) <= 0.01:
                 continue
-            pid = int(w.get("kCGWindowOwnerPID") or 0)
-            title = w.get("kCGWindowName") or None
-            return (str(owner), pid, title)
+            return (str(owner), int(w.get(pid_key) or 0), w.get(name_key) or None)
         # as last resort, return top entry anyway
         top = info[0]
-        return (str(top.get("kCGWindowOwnerName") or ""), int(top.get("kCGWindowOwnerPID") or 0), top.get("kCGWindowName") or None)
+        return (str(top.get(owner_key) or ""), int(top.get(pid_key) or 0), top.get(name_key) or None)
     except Exception:
         return None
 
@@ -206,31 +424,67 @@ def get_frontmost_via_nsworkspace() -> Optional[Tuple[str, int]]:
     except Exception:
         return None
 
+# ---------- pid -> bundle id cache ----------
+# runningApplicationWithProcessIdentifier_ does a linear scan of running apps;
+# pids are stable for a process lifetime, so a dict lookup replaces the scan.
+_PID_BID: Dict[int, str] = {}
+
+def bid_for(pid: int) -> str:
+    bid = _PID_BID.get(pid)
+    if bid is not None:
+        return bid
+    ra = NSRunningApplication.runningApplicationWithProcessIdentifier_(pid)
+    bid = str(ra.bundleIdentifier() or "") if ra else ""
+    if ra:  # don't cache lookups that failed (app may still be launching)
+        _PID_BID[pid] = bid
+    return bid
+
+def _install_pid_cache_eviction():
+    """Evict cache entries when their app terminates (guards pid reuse)."""
+    try:
+        from AppKit import NSWorkspaceDidTerminateApplicationNotification
+
+        def _on_terminate(note):
+            app = note.userInfo().get("NSWorkspaceApplicationKey")
+            if app is not None:
+                pid = int(app.processIdentifier())
+                _PID_BID.pop(pid, None)
+                _AX_TITLE.pop(pid, None)
+                _AX_OBSERVERS.pop(pid, None)
+
+        NSWorkspace.sharedWorkspace().notificationCenter().addObserverForName_object_queue_usingBlock_(
+            NSWorkspaceDidTerminateApplicationNotification, None, None, _on_terminate
+        )
+    except Exception as e:
+        log(f"[WARN] pid-cache eviction observer not installed: {e}")
+
+_install_pid_cache_eviction()
+
+# Bundles NSWorkspace is known to misreport during transitions; for these we
+# double-check with the slower Quartz/System Events paths.
+_AMBIGUOUS_BUNDLES = {""}
+
 # Unified frontmost: returns (app_name, bundle_id, pid, fallback_title)
 def get_frontmost_app() -> Optional[Tuple[str, str, int, Optional[str]]]:
-    # Try System Events
-    se = get_frontmost_via_system_events()
-    if se:
-        name, pid = se
-        ra = NSRunningApplication.runningApplicationWithProcessIdentifier_(pid)
-        bid = str(ra.bundleIdentifier() or "") if ra else ""
-        return (name, bid, pid, None)
+    # PRIMARY: NSWorkspace — pure in-process Cocoa, no IPC round-trip.
+    ws = get_frontmost_via_nsworkspace()
+    if ws:
+        name, pid = ws
+        bid = bid_for(pid)
+        if bid not in _AMBIGUOUS_BUNDLES:
+            return (name, bid, pid, None)
 
-    # Try Quartz
+    # FALLBACK: Quartz (filters overlays; only when NSWorkspace was ambiguous)
     q = get_frontmost_via_quartz()
     if q:
         name, pid, qtitle = q
-        ra = NSRunningApplication.runningApplicationWithProcessIdentifier_(pid)
-        bid = str(ra.bundleIdentifier() or "") if ra else ""
-        return (name, bid, pid, qtitle)
+        return (name, bid_for(pid), pid, qtitle)
 
-    # Try NSWorkspace
-    ws = get_frontmost_via_nsworkspace()
-    if ws:
-        name, pid = ws
-        ra = NSRunningApplication.runningApplicationWithProcessIdentifier_(pid)
-        bid = str(ra.bundleIdentifier() or "") if ra else ""
-        return (name, bid, pid, None)
+    # LAST RESORT: System Events (IPC; script avoids the slow whose-clause)
+    se = get_frontmost_via_system_events()
+    if se:
+        name, pid = se
+        return (name, bid_for(pid), pid, None)
 
     return None
 
@@ -241,9 +495,86 @@ def _ax_ok(code: int) -> bool:
     except Exception:
         return False
 
+# Run-loop pumping: AX observer callbacks and NSWorkspace notification blocks
+# registered with queue=None are all delivered on this thread's run loop, so
+# the poll loop has to spin it for any of them to fire.
+RUNLOOP_AVAILABLE = False
+try:
+    from CoreFoundation import (
+        CFRunLoopGetCurrent,
+        CFRunLoopAddSource,
+        CFRunLoopRunInMode,
+        kCFRunLoopDefaultMode,
+    )
+    RUNLOOP_AVAILABLE = True
+except Exception:
+    pass
+
+# Focused-window-change observers: instead of a synchronous AX IPC round-trip
+# per poll, cache the title per pid and only re-read when the app tells us the
+# focused window changed. Requires pumping the run loop (see main loop).
+AX_OBSERVER_AVAILABLE = False
+if AX_AVAILABLE and RUNLOOP_AVAILABLE:
+    try:
+        from ApplicationServices import (
+            AXObserverCreate,
+            AXObserverAddNotification,
+            AXObserverGetRunLoopSource,
+            kAXFocusedWindowChangedNotification,
+            kAXTitleChangedNotification,
+        )
+        AX_OBSERVER_AVAILABLE = True
+    except Exception:
+        AX_OBSERVER_AVAILABLE = False
+
+_AX_TITLE: Dict[int, Optional[str]] = {}   # pid -> last known focused title
+_AX_OBSERVERS: Dict[int, object] = {}      # pid -> AXObserver (kept alive)
+
+def pump_ax_notifications():
+    """Drain pending run-loop callbacks without blocking (no-op otherwise).
+
+    Not gated on _AX_OBSERVERS: the workspace notification blocks (pid-cache
+    eviction, activations) ride the same run loop and need delivering even
+    with AX disabled.
+    """
+    if RUNLOOP_AVAILABLE:
+        try:
+            CFRunLoopRunInMode(kCFRunLoopDefaultMode, 0, False)
+        except Exception:
+            pass
+
+def _install_ax_observer(pid: int) -> None:
+    if not AX_OBSERVER_AVAILABLE or pid in _AX_OBSERVERS:
+        return
+    try:
+        def _on_change(_observer, _element, _notification, _refcon, _pid=pid):
+            # re-read lazily on the next poll rather than inside the callback
+            _AX_TITLE.pop(_pid, None)
+
+        err, obs = AXObserverCreate(pid, _on_change, None)
+        if not _ax_ok(err) or obs is None:
+            return
+        app_ref = AXUIElementCreateApplication(pid)
+        AXObserverAddNotification(obs, app_ref, kAXFocusedWindowChangedNotification, None)
+        AXObserverAddNotification(obs, app_ref, kAXTitleChangedNotification, None)
+        CFRunLoopAddSource(CFRunLoopGetCurrent(), AXObserverGetRunLoopSource(obs), kCFRunLoopDefaultMode)
+        _AX_OBSERVERS[pid] = obs
+    except Exception as e:
+        log(f"[WARN] AX observer install failed for pid {pid}: {e}")
+
 def get_window_title_via_ax(pid: int) -> Optional[str]:
     if not AX_AVAILABLE:
         return None
+    # observer-backed cache hit: no IPC at all
+    if pid in _AX_OBSERVERS and pid in _AX_TITLE:
+        return _AX_TITLE[pid]
+    title = _ax_read_title(pid)
+    _install_ax_observer(pid)
+    if pid in _AX_OBSERVERS:
+        _AX_TITLE[pid] = title
+    return title
+
+def _ax_read_title(pid: int) -> Optional[str]:
     try:
         app_ref = AXUIElementCreateApplication(pid)
         try:
@@ -265,99 +596,191 @@ def get_window_title_via_ax(pid: int) -> Optional[str]:
         log(f"[WARN] AX read failed: {e}")
         return None
 
-# ---------- URL/path via AppleScript (with retry) ----------
-def try_get_url_or_path(bundle_id: str) -> Dict[str, Optional[str]]:
-    # Safari
-    if bundle_id == "com.apple.Safari":
-        url = osa_retry(
-            'tell application "Safari" to try\n'
-            'set u to URL of current tab of front window\n'
-            'return u\non error\nreturn ""\nend try'
-        )
-        return {"url": url or None, "file_path": None}
-
-    # Chrome (stable/canary)
-    if bundle_id in ("com.google.Chrome", "com.google.Chrome.canary"):
-        url = osa_retry(
-            'tell application "Google Chrome" to try\n'
-            'set u to URL of active tab of front window\n'
-            'return u\non error\nreturn ""\nend try'
-        )
-        return {"url": url or None, "file_path": None}
-
-    # Brave
-    if bundle_id == "com.brave.Browser":
-        url = osa_retry(
-            'tell application "Brave Browser" to try\n'
-            'set u to URL of active tab of front window\n'
-            'return u\non error\nreturn ""\nend try'
-        )
-        return {"url": url or None, "file_path": None}
-
-    # Preview
-    if bundle_id == "com.apple.Preview":
-        path = osa_retry(
-            'tell application "Preview" to try\n'
-            'set theDoc to document 1\n'
-            'set p to path of theDoc\n'
-            'POSIX path of p\n'
-            'on error\nreturn ""\nend try'
-        )
-        return {"url": None, "file_path": path or None}
-
-    # Excel
-    if bundle_id == "com.microsoft.Excel":
-        path = osa_retry(
-            'tell application "Microsoft Excel" to try\n'
-            'if not (exists active workbook) then return ""\n'
-            'set p to (full name of active workbook)\n'
-            'return POSIX path of p\n'
-            'on error\nreturn ""\nend try'
-        )
-        return {"url": None, "file_path": path or None}
-
-    # Sublime Text (v4/v3)
-    if bundle_id in ("com.sublimetext.4", "com.sublimetext.3"):
-        path = osa_retry(
-            'tell application "Sublime Text" to try\n'
-            'if not (exists window 1) then return ""\n'
-            'set theDoc to document of window 1\n'
-            'if theDoc is missing value then return ""\n'
-            'set p to (path of theDoc)\n'
-            'return POSIX path of p\n'
-            'on error\nreturn ""\nend try'
-        )
-        return {"url": None, "file_path": path or None}
+# ---------- URL/path via AppleScript ----------
+# bundle id -> (script source, which field it fills). O(1) dispatch replaces
+# the old if/elif chain; the scripts themselves are compile-cached by run_osa.
+BUNDLE_SCRIPTS: Dict[str, Tuple[str, str]] = {
+    "com.apple.Safari":         (SCRIPT_SAFARI_URL, "url"),
+    "com.google.Chrome":        (SCRIPT_CHROME_URL, "url"),
+    "com.google.Chrome.canary": (SCRIPT_CHROME_URL, "url"),
+    "com.brave.Browser":        (SCRIPT_BRAVE_URL, "url"),
+    "com.apple.Preview":        (SCRIPT_PREVIEW_PATH, "file_path"),
+    "com.microsoft.Excel":      (SCRIPT_EXCEL_PATH, "file_path"),
+    "com.sublimetext.4":        (SCRIPT_SUBLIME_PATH, "file_path"),
+    "com.sublimetext.3":        (SCRIPT_SUBLIME_PATH, "file_path"),
+}
 
-    return {"url": None, "file_path": None}
+# Chromium browsers can expose the active tab over the DevTools protocol
+# (launch with --remote-debugging-port). One localhost HTTP GET (~ms) beats
+# the AppleScript round-trip; the connection is kept alive across polls.
+CDP_PORT = config.get("chrome_cdp_port") or int(os.getenv("AGENT_CHROME_CDP_PORT", "0"))
+_CDP_BUNDLES = frozenset({"com.google.Chrome", "com.google.Chrome.canary", "com.brave.Browser"})
+_CDP_CONN = None
+
+def _cdp_active_tab_url() -> Optional[str]:
+    global _CDP_CONN
+    for attempt in (1, 2):
+        try:
+            if _CDP_CONN is None:
+                _CDP_CONN = http.client.HTTPConnection("127.0.0.1", CDP_PORT, timeout=1)
+            _CDP_CONN.request("GET", "/json", headers={"Connection": "keep-alive"})
+            tabs = json.loads(_CDP_CONN.getresponse().read())
+            for t in tabs:  # /json lists most-recently-active first
+                if t.get("type") == "page":
+                    return t.get("url") or None
+            return None
+        except Exception:
+            try:
+                if _CDP_CONN:
+                    _CDP_CONN.close()
+            except Exception:
+                pass
+            _CDP_CONN = None
+            if attempt == 2:
+                return None
+
+def try_get_url_or_path(bundle_id: str) -> Dict[str, Optional[str]]:
+    if CDP_PORT and bundle_id in _CDP_BUNDLES:
+        url = _cdp_active_tab_url()
+        if url:
+            return {"url": url, "file_path": None}
+        # debug port closed or empty: fall through to the AppleScript path
+    entry = BUNDLE_SCRIPTS.get(bundle_id)
+    if not entry:
+        return {"url": None, "file_path": None}
+    script, field = entry
+    # The retry/sleep existed for osascript spawn flakiness; in-process OSAKit
+    # doesn't need it, so only the subprocess fallback keeps the retry.
+    value = osa(script) if OSAKIT_AVAILABLE else osa_retry(script)
+    out: Dict[str, Optional[str]] = {"url": None, "file_path": None}
+    out[field] = value or None
+    return out
 
 # ---------- Posting ----------
+# One long-lived worker drains a queue over a single keep-alive HTTP
+# connection, instead of spawning a thread (and a fresh TCP/TLS handshake)
+# per event.
+import queue
+import http.client
+import urllib.parse as _urlparse
+
+_POST_Q: "queue.Queue[dict]" = queue.Queue(maxsize=1024)
+
+def _post_headers() -> Dict[str, str]:
+    h = {"Content-Type": "application/json", "Connection": "keep-alive"}
+    if API_KEY:
+        h["Authorization"] = f"Bearer {API_KEY}"
+    return h
+
+POST_BATCH_MAX = 200
+POST_BATCH_WAIT = 2.0
+
+def _drain_batch() -> list:
+    """Block for one event, then gather more for up to POST_BATCH_WAIT seconds."""
+    events = [_POST_Q.get()]
+    deadline = time.time() + POST_BATCH_WAIT
+    while len(events) < POST_BATCH_MAX:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            events.append(_POST_Q.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return events
+
+def _unposted_rows() -> list:
+    """Events the server never confirmed (own connection; WAL allows the read)."""
+    try:
+        rconn = sqlite3.connect(DB_PATH)
+        rows = rconn.execute(
+            "SELECT ts_utc, app_name, bundle_id, window_title, url, file_path, user, hostname "
+            "FROM raw_events WHERE posted=0 ORDER BY id"
+        ).fetchall()
+        rconn.close()
+        cols = ("ts_utc", "app_name", "bundle_id", "window_title", "url", "file_path", "user", "hostname")
+        return [dict(zip(cols, r)) for r in rows]
+    except Exception as e:
+        log(f"[REPLAY ERROR] {e}")
+        return []
+
+def _post_worker():
+    parsed = _urlparse.urlparse(POST_URL)
+    conn_cls = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+    conn = None
+    offline = False
+    while True:
+        events = _drain_batch()
+        body = json.dumps(events).encode("utf-8")
+        sent = False
+        for attempt in (1, 2):  # one reconnect if the kept-alive socket went stale
+            try:
+                if conn is None:
+                    conn = conn_cls(parsed.netloc, timeout=5)
+                conn.request("POST", path, body=body, headers=_post_headers())
+                resp = conn.getresponse()
+                resp.read()
+                if 200 <= resp.status < 300:
+                    log(f"[POSTED] {len(events)} event(s) -> {POST_URL} ({resp.status})")
+                    sent = True
+                else:
+                    # server rejected or errored: leave posted=0 so the batch
+                    # stays in the reconnect replay instead of being dropped
+                    log(f"[POST ERROR] HTTP {resp.status} from {POST_URL}")
+                break
+            except Exception as e:
+                try:
+                    if conn:
+                        conn.close()
+                except Exception:
+                    pass
+                conn = None
+                if attempt == 2:
+                    log(f"[POST ERROR] {e}")
+        if sent:
+            mark_posted([e["ts_utc"] for e in events])
+            if offline:
+                # back online: replay everything the server never confirmed
+                backlog = _unposted_rows()
+                for i in range(0, len(backlog), POST_BATCH_MAX):
+                    for e in backlog[i:i + POST_BATCH_MAX]:
+                        post_event_async(e)
+            offline = False
+        else:
+            offline = True
+
+def start_poster():
+    if POST_URL:
+        threading.Thread(target=_post_worker, daemon=True).start()
+
 def post_event_async(event: dict):
     if not POST_URL:
         return
-    def _run():
+    try:
+        _POST_Q.put_nowait(event)
+    except queue.Full:
+        # drop-oldest: keep the freshest events under sustained backpressure
         try:
-            import urllib.request
-            req = urllib.request.Request(POST_URL, data=json.dumps(event).encode("utf-8"), method="POST")
-            req.add_header("Content-Type", "application/json")
-            if API_KEY:
-                req.add_header("Authorization", f"Bearer {API_KEY}")
-            with urllib.request.urlopen(req, timeout=5) as resp:
-                _ = resp.read()
-            log(f"[POSTED] {POST_URL}")
-        except Exception as e:
-            log(f"[POST ERROR] {e}")
-    threading.Thread(target=_run, daemon=True).start()
+            _POST_Q.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            _POST_Q.put_nowait(event)
+        except queue.Full:
+            pass
 
-def write_event(conn, cur, user: str, hostname: str, sig):
+def write_event(user: str, hostname: str, sig):
     app_name, bundle_id, title, url, fpath = sig
-    ts = datetime.now(timezone.utc).isoformat()
-    cur.execute(
-        "INSERT INTO raw_events (ts_utc, app_name, bundle_id, window_title, url, file_path, user, hostname) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (ts, app_name, bundle_id, title or "", url, fpath, user, hostname),
-    )
-    conn.commit()
+    now = time.time()
+    ts_epoch = int(now)
+    # ISO text is built once here — for the POST payload and the compat column
+    ts = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    with _PENDING_LOCK:
+        _PENDING.append((ts, ts_epoch, app_name, bundle_id, title or "", url, fpath, user, hostname))
+        do_flush = len(_PENDING) >= FLUSH_BATCH_SIZE
+    if do_flush:
+        _DB_WAKE.set()   # nudge the writer; the poll loop never touches the DB
     post_event_async({
         "ts_utc": ts, "app_name": app_name, "bundle_id": bundle_id,
         "window_title": title or "", "url": url, "file_path": fpath,
@@ -365,6 +788,76 @@ def write_event(conn, cur, user: str, hostname: str, sig):
     })
     log(f"[EVENT] dwell-finalized • {app_name} • {title or '(no title)'} • url={url or '-'} • path={fpath or '-'}")
 
+# ---------- Activation notifications ----------
+# macOS already tells us when the frontmost app changes; the wait below runs
+# the run loop (which is where queue=None notification blocks are delivered)
+# so an app switch ends the wait immediately, while the POLL_SECONDS timeout
+# still catches in-app title/URL changes.
+_ACTIVATION_Q: "queue.Queue" = queue.Queue(maxsize=64)
+
+def _install_activation_observer():
+    try:
+        from AppKit import (
+            NSWorkspaceDidActivateApplicationNotification,
+            NSWorkspaceDidDeactivateApplicationNotification,
+        )
+
+        def _on_activation(note):
+            app = note.userInfo().get("NSWorkspaceApplicationKey")
+            if app is None:
+                return
+            try:
+                _ACTIVATION_Q.put_nowait(
+                    (str(app.localizedName() or ""), int(app.processIdentifier()))
+                )
+            except queue.Full:
+                pass
+
+        nc = NSWorkspace.sharedWorkspace().notificationCenter()
+        for name in (
+            NSWorkspaceDidActivateApplicationNotification,
+            NSWorkspaceDidDeactivateApplicationNotification,
+        ):
+            nc.addObserverForName_object_queue_usingBlock_(name, None, None, _on_activation)
+    except Exception as e:
+        log(f"[WARN] activation observer not installed: {e}")
+
+def _drain_activations():
+    try:
+        while True:  # collapse bursts; the poll re-reads frontmost anyway
+            _ACTIVATION_Q.get_nowait()
+    except queue.Empty:
+        pass
+
+def wait_for_activity(timeout: float):
+    """Block until an app activation fires or the poll timeout elapses.
+
+    The notification blocks only run while this thread spins its run loop,
+    so the wait is CFRunLoopRunInMode (which returns as soon as a source is
+    handled), not a queue.get that nothing could fill meanwhile.
+    """
+    if not RUNLOOP_AVAILABLE:
+        time.sleep(timeout)
+        return
+    # An activation queued since the last frontmost read means the world may
+    # already have changed — poll immediately instead of eating the wait.
+    if not _ACTIVATION_Q.empty():
+        _drain_activations()
+        return
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        try:
+            CFRunLoopRunInMode(kCFRunLoopDefaultMode, remaining, True)
+        except Exception:
+            time.sleep(remaining)
+            return
+        if not _ACTIVATION_Q.empty():
+            _drain_activations()
+            return
+
 # ---------- Main ----------
 def main():
     # live logs
@@ -388,16 +881,41 @@ def main():
     log("[NOTE] On first URL read, macOS may prompt to allow Terminal to control Safari/Chrome (Automation).")
     log("[TIP] Screen Recording is optional; enabling it can improve Quartz window titles.")
 
-    conn = ensure_db()
-    cur = conn.cursor()
+    start_db_writer()
+    start_poster()
+    _install_activation_observer()
     user = os.getenv("USER") or "unknown"
     hostname = platform.node()
 
     current_sig = None
     dwell_start = None
+    current_cheap = None   # (pid, bundle_id, app_name) — change detector
+    last_detail_ts = 0.0   # when we last resolved title/url/path
 
     while True:
         try:
+            # deliver any queued AX focus-change callbacks (non-blocking)
+            pump_ax_notifications()
+
+            # Idle backoff: no keyboard/mouse input for a while means nothing
+            # to record — finalize the open dwell once and sleep longer, so an
+            # idle Mac isn't burning AX/AppleScript calls all night.
+            idle = CGEventSourceSecondsSinceLastEventType(
+                kCGEventSourceStateHIDSystemState, kCGAnyInputEventType
+            )
+            if idle > IDLE_AFTER_SECONDS:
+                if current_sig and dwell_start:
+                    dwell = time.time() - dwell_start
+                    if dwell >= MIN_DWELL_SECONDS:
+                        write_event(user, hostname, current_sig)
+                    current_sig = None
+                    dwell_start = None
+                    current_cheap = None
+                if PRINT_EVERY_POLL:
+                    log(f"[POLL] idle {int(idle)}s, backing off")
+                time.sleep(min(60, POLL_SECONDS * 8))
+                continue
+
             # unified frontmost detection
             front = get_frontmost_app()
             if not front:
@@ -415,12 +933,23 @@ def main():
                 if current_sig and dwell_start:
                     dwell = time.time() - dwell_start
                     if dwell >= MIN_DWELL_SECONDS:
-                        write_event(conn, cur, user, hostname, current_sig)
+                        write_event(user, hostname, current_sig)
                 current_sig = None
                 dwell_start = None
+                current_cheap = None
                 time.sleep(POLL_SECONDS)
                 continue
 
+            # Change detector: most polls are pure dwell extension — if the
+            # frontmost (pid, bundle, app) hasn't changed and details are
+            # fresh, skip the expensive AX + AppleScript round-trips.
+            cheap = (pid, bundle_id, app_name)
+            if current_sig and cheap == current_cheap and (time.time() - last_detail_ts) < REFRESH_DETAILS_SECONDS:
+                if PRINT_EVERY_POLL:
+                    log(f"[POLL] dwelling {int(time.time()-dwell_start)}s • {app_name} (details cached)")
+                wait_for_activity(POLL_SECONDS)
+                continue
+
             # title via AX, else Quartz fallback title
             title_ax = get_window_title_via_ax(pid) or ""
             title = title_ax or (fallback_title or "")
@@ -429,13 +958,16 @@ def main():
             extras = try_get_url_or_path(bundle_id)
             url, fpath = extras.get("url"), extras.get("file_path")
 
+            current_cheap = cheap
+            last_detail_ts = time.time()
+
             sig = (app_name, bundle_id, title, url, fpath)
 
             if sig != current_sig:
                 if current_sig and dwell_start:
                     dwell = time.time() - dwell_start
                     if dwell >= MIN_DWELL_SECONDS:
-                        write_event(conn, cur, user, hostname, current_sig)
+                        write_event(user, hostname, current_sig)
                     else:
                         log(f"[SKIP] dwell too short ({int(dwell)}s) for {current_sig[0]}")
                 current_sig = sig
@@ -445,14 +977,15 @@ def main():
                 if PRINT_EVERY_POLL:
                     log(f"[POLL] dwelling {int(time.time()-dwell_start)}s • {app_name}")
 
-            time.sleep(POLL_SECONDS)
+            wait_for_activity(POLL_SECONDS)
 
         except KeyboardInterrupt:
             log("=== Stopping (Ctrl+C) ===")
             if current_sig and dwell_start:
                 dwell = time.time() - dwell_start
                 if dwell >= MIN_DWELL_SECONDS:
-                    write_event(conn, cur, user, hostname, current_sig)
+                    write_event(user, hostname, current_sig)
+            stop_db_writer()
             break
         except Exception as e:
             log(f"[LOOP ERROR] {e}")
@@ -4,5 +4,6 @@ from django.urls import path, include
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("tracker.urls")),
+    path("tracker/", include("tracker.urls")),        # legacy agent prefix
     path("export/", include("tracker.export_urls")),  # CSV export
 ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-08-27 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tracker', '0002_client_project_block_rule_suggestion_task_block_task'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(fields=['org', 'start'], name='tracker_blo_org_id_da1583_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(fields=['start'], name='tracker_blo_start_4c1ece_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='block',
+            index=models.Index(fields=['user', 'hostname', 'start'], name='tracker_blo_user_5bdc6f_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-08-27 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_block_tracker_blo_org_id_da1583_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rawevent',
+            index=models.Index(fields=['user', 'hostname', 'ts_utc'], name='tracker_raw_user_923936_idx'),
+        ),
+    ]
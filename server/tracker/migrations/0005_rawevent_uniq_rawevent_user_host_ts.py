@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-08-27 09:10
+
+from django.db import migrations, models
+
+
+def dedupe_raw_events(apps, schema_editor):
+    """Drop duplicate (user, hostname, ts_utc) rows, keeping the earliest.
+
+    Agent retries against the pre-constraint schema inserted the same
+    sample more than once; AddConstraint would refuse to apply on such
+    databases.
+    """
+    RawEvent = apps.get_model("tracker", "RawEvent")
+    keep_ids = (
+        RawEvent.objects.order_by()
+        .values("user", "hostname", "ts_utc")
+        .annotate(keep_id=models.Min("id"))
+        .values_list("keep_id", flat=True)
+    )
+    RawEvent.objects.exclude(id__in=list(keep_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_rawevent_tracker_raw_user_923936_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_raw_events, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rawevent',
+            constraint=models.UniqueConstraint(fields=('user', 'hostname', 'ts_utc'), name='uniq_rawevent_user_host_ts'),
+        ),
+    ]
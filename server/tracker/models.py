@@ -9,7 +9,16 @@ class RawEvent(models.Model):
     user=models.CharField(max_length=255, blank=True, null=True)
     hostname=models.CharField(max_length=255, blank=True, null=True)
     class Meta:
-        indexes=[models.Index(fields=['ts_utc']), models.Index(fields=['user','hostname'])]
+        # one foreground sample per (user, host, second): makes agent retry
+        # batches a no-op under ignore_conflicts / ON CONFLICT DO NOTHING
+        constraints=[models.UniqueConstraint(fields=['user','hostname','ts_utc'], name='uniq_rawevent_user_host_ts')]
+        indexes=[
+            models.Index(fields=['ts_utc']),
+            models.Index(fields=['user','hostname']),
+            # compactor scope: equality on user/hostname + range-and-sort on
+            # ts_utc become one index range scan with no explicit sort
+            models.Index(fields=['user','hostname','ts_utc']),
+        ]
         
 class SuggestedBlock(models.Model):
     start=models.DateTimeField()
@@ -58,6 +67,15 @@ class Block(models.Model):
     task = models.ForeignKey(Task, null=True, blank=True, on_delete=models.SET_NULL)
     notes = models.TextField(blank=True, default="")
     locked = models.BooleanField(default=False)  # after approval/export
+    class Meta:
+        indexes = [
+            models.Index(fields=['org', 'start']),
+            # the daily export/UI filter and sort on start; no INCLUDE list —
+            # title/url/file_path are unbounded TEXT and would blow Postgres'
+            # btree row-size limit on long URLs
+            models.Index(fields=['start']),
+            models.Index(fields=['user', 'hostname', 'start']),
+        ]
 
 class Suggestion(models.Model):
     block = models.ForeignKey(Block, on_delete=models.CASCADE, related_name="suggestions")
@@ -1,7 +1,16 @@
+import hmac
 import os
 from rest_framework.permissions import BasePermission
 from django.conf import settings
 
+# Resolved once at import: the key comes from settings/.env and doesn't change
+# while the process lives, so no env lookup on the per-request path.
+_EXPECTED_AGENT_KEY = (
+    getattr(settings, "AGENT_KEY", None) or os.getenv("AGENT_API_KEY", "")
+).encode()
+
+_KEY_HEADERS = ("Agent-Key", "X-Agent-Key")
+
 
 class AgentKeyPermission(BasePermission):
     """
@@ -12,25 +21,24 @@ class AgentKeyPermission(BasePermission):
         Agent-Key: <key>
         X-Agent-Key: <key>
         Authorization: Bearer <key>
+
+    Comparisons use hmac.compare_digest so a mismatch takes the same time
+    regardless of where the strings diverge.
     """
 
     def has_permission(self, request, view):
-        expected = getattr(settings, "AGENT_KEY", None) or os.getenv("AGENT_API_KEY", "")
-        if not expected:
+        if not _EXPECTED_AGENT_KEY:
             return False
 
-        # allow multiple header names
-        key = (
-            request.headers.get("Agent-Key")
-            or request.headers.get("X-Agent-Key")
-            or ""
-        )
-
-        if key == expected:
-            return True
+        headers = request.headers
 
-        auth = request.headers.get("Authorization") or ""
-        if auth.startswith("Bearer ") and auth[7:] == expected:
-            return True
+        # allow multiple header names: one dict lookup each, no or-chains
+        for name in _KEY_HEADERS:
+            v = headers.get(name)
+            if v and hmac.compare_digest(v.encode(), _EXPECTED_AGENT_KEY):
+                return True
 
-        return False
+        auth = headers.get("Authorization", "")
+        return auth.startswith("Bearer ") and hmac.compare_digest(
+            auth[7:].encode(), _EXPECTED_AGENT_KEY
+        )
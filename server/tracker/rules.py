@@ -1,16 +1,113 @@
 import re, fnmatch
+from functools import lru_cache
+
+try:
+    import ahocorasick  # pyahocorasick; optional — falls back to per-rule scans
+except ImportError:
+    ahocorasick = None
+
+
+@lru_cache(maxsize=1024)
+def _compiled(rule_id, kind, pattern):
+    """Per-rule compiled artifacts, built once per (id, kind, pattern).
+
+    re.search with a string pattern round-trips Python's small regex cache
+    and fnmatch re-translates the glob on every call; compiling up front
+    makes the per-(block, rule) check a direct C-level match.
+    """
+    return {
+        "lower_pattern": pattern.lower(),
+        "regex": re.compile(pattern, re.I) if kind == "regex" else None,
+        "glob_re": re.compile(fnmatch.translate(pattern)) if kind == "glob" else None,
+    }
+
+
+# One automaton per contains-rule set: R substring scans of hay collapse into
+# a single linear pass. Keyed on (id, pattern) pairs so rule edits rebuild it.
+_AC_CACHE: dict = {}
+
+def _contains_automaton(contains_rules):
+    key = tuple((r.id, r.pattern) for r in contains_rules)
+    automaton = _AC_CACHE.get(key)
+    if automaton is None:
+        words = {}
+        for r in contains_rules:
+            words.setdefault(r.pattern.lower(), []).append((r.field, r.value_text))
+        automaton = ahocorasick.Automaton()
+        for word, payloads in words.items():
+            automaton.add_word(word, payloads)
+        automaton.make_automaton()
+        _AC_CACHE.clear()  # rule sets change rarely; one live automaton is enough
+        _AC_CACHE[key] = automaton
+    return automaton
+
+
+# One union regex per glob-rule set, cached like the automaton above.
+_GLOB_CACHE: dict = {}
+
+def _glob_union(glob_rules):
+    """Single alternation regex over every glob pattern in the rule set.
+
+    Used as a prefilter: one scan of the url/path decides whether any glob
+    can match before the per-rule checks run, so the common no-glob-hit
+    block skips R match calls. (re.match reports only the first matching
+    alternative, so the per-rule pass still decides *which* rules hit.)
+    """
+    key = tuple((r.id, r.pattern) for r in glob_rules)
+    union = _GLOB_CACHE.get(key)
+    if union is None:
+        union = re.compile("|".join(fnmatch.translate(r.pattern) for r in glob_rules))
+        _GLOB_CACHE.clear()
+        _GLOB_CACHE[key] = union
+    return union
+
 
 def apply_rules(block, rules):
-    """Return list of (field, value_text, confidence)."""
+    """Yield (field, value_text, confidence) tuples as rules match.
+
+    A generator so callers that cap the number of suggestions stop the
+    scan after the cap instead of evaluating every remaining rule.
+    Cheapest checks come first: automaton hits, prefiltered globs, then
+    the per-rule contains/regex scans.
+    """
     hay = " ".join([block.title or "", block.url or "", block.file_path or ""]).lower()
-    out = []
+
+    contains_rules = []
+    glob_rules = []
+    scan_rules = []
     for r in rules:
-        pat = r.pattern.lower()
+        if not r.active:
+            continue
+        if r.kind == "contains" and ahocorasick is not None:
+            contains_rules.append(r)
+        elif r.kind == "glob":
+            glob_rules.append(r)
+        else:
+            scan_rules.append(r)
+
+    if contains_rules:
+        seen = set()
+        for _end, payloads in _contains_automaton(contains_rules).iter(hay):
+            for field, value_text in payloads:
+                if (field, value_text) not in seen:
+                    seen.add((field, value_text))
+                    yield (field, value_text, 0.85)
+
+    if glob_rules:
+        url = block.url or ""
+        fpath = block.file_path or ""
+        union = _glob_union(glob_rules)
+        if union.match(url) or union.match(fpath):
+            for r in glob_rules:
+                c = _compiled(r.id, r.kind, r.pattern)
+                if c["glob_re"].match(url) or c["glob_re"].match(fpath):
+                    yield (r.field, r.value_text, 0.85)
+
+    for r in scan_rules:
+        c = _compiled(r.id, r.kind, r.pattern)
         hit = (
-            (r.kind=="contains" and pat in hay) or
-            (r.kind=="regex" and re.search(r.pattern, hay, re.I)) or
-            (r.kind=="glob" and (fnmatch.fnmatch(block.url or "", r.pattern) or fnmatch.fnmatch(block.file_path or "", r.pattern)))
+            (r.kind == "contains" and c["lower_pattern"] in hay) or
+            (r.kind == "regex" and c["regex"].search(hay))
         )
-        if hit and r.active:
-            out.append((r.field, r.value_text, 0.85))  # base confidence for rules
-    return out
+        if hit:
+            yield (r.field, r.value_text, 0.85)  # base confidence for rules
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path("ping/", views.ping),
     path("raw-events/", views.raw_events),              # Agent (with Agent-Key)
+    path("raw-events-bulk/", views.raw_events_bulk),    # Agent, batched array payloads
     path("ingest-raw-event/", views.ingest_raw_event),  # dev-only open
     path("blocks-today/", views.blocks_today),
     path("suggestions-today/", views.suggestions_today),
@@ -1,14 +1,17 @@
 # tracker/views.py
 from __future__ import annotations
 
-import csv
-import io
-import urllib.parse
-from datetime import timedelta
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
 from typing import Optional, List, Dict, Any
 
 from django.conf import settings
-from django.db import transaction
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.http import HttpResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
@@ -17,17 +20,32 @@ from django.utils.timezone import localtime
 from rest_framework import status
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.decorators import (
-    api_view, authentication_classes, permission_classes, throttle_classes
+    api_view, authentication_classes, parser_classes, permission_classes, throttle_classes
 )
-from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 
+try:
+    import orjson  # optional — falls back to DRF's renderer pipeline
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np  # optional — accelerates the non-Postgres compactor fallback
+except ImportError:
+    np = None
+
+try:
+    from psycopg2.extras import execute_values  # multi-row VALUES on the Postgres path
+except ImportError:
+    execute_values = None
+
 from .models import RawEvent, Block, Rule, Suggestion, Client, Project, Task
 from .permissions import AgentKeyPermission
 from .rules import apply_rules
-from .serializers import RawEventSerializer
 
 from datetime import timezone as dt_timezone
 
@@ -43,6 +61,18 @@ DEFAULT_USER = "unknown-user"
 DEFAULT_HOST = "unknown-host"
 
 
+# Block schema facts, resolved once at import time; the request paths used to
+# re-answer these via hasattr()/_meta reflection for every call.
+_BLOCK_FIELDS = {f.name for f in Block._meta.fields}
+BLOCK_HAS_USER = "user" in _BLOCK_FIELDS
+BLOCK_HAS_HOSTNAME = "hostname" in _BLOCK_FIELDS
+BLOCK_HAS_MINUTES = "minutes" in _BLOCK_FIELDS
+BLOCK_HAS_ORG = "org" in _BLOCK_FIELDS
+BLOCK_ORG_REQUIRED = BLOCK_HAS_ORG and not Block._meta.get_field("org").null
+
+# end - start computed database-side; rows come back with the duration ready
+_DURATION_EXPR = ExpressionWrapper(F("end") - F("start"), output_field=DurationField())
+
 # Toggle UI auth with a Django setting (default False for dev)
 USE_AUTH = bool(getattr(settings, "USE_AUTH", False))
 PermUI = IsAuthenticated if USE_AUTH else AllowAny
@@ -57,23 +87,74 @@ def _start_of_local_day_utc(dt: Optional[timezone.datetime] = None) -> timezone.
     return sod_local.astimezone(dt_timezone.utc)
 
 
-def _label_from_event(e: RawEvent) -> str:
+# Host extraction for labels: urlparse builds a full 6-tuple with quoting
+# rules we never use, and even a regex match allocates a Match object per
+# event. Two str.find slices do the job, and the cache makes repeated URLs
+# (the common case in a polling agent's day) free.
+@lru_cache(maxsize=4096)
+def _host_from_url(url: str) -> str:
+    i = url.find("://")
+    s = url[i + 3:] if i >= 0 else url
+    for sep in "/?#":
+        j = s.find(sep)
+        if j >= 0:
+            s = s[:j]
+    k = s.find(":")
+    if k >= 0:
+        s = s[:k]
+    return s.lower()
+
+
+def _label_from_event(e) -> str:
     # url host -> file basename -> window title -> app name
+    # (accepts a RawEvent or any row tuple exposing the same attributes)
     if e.url:
-        try:
-            host = urllib.parse.urlparse(e.url).hostname or ""
-            if host:
-                return host
-        except Exception:
-            pass
+        host = _host_from_url(e.url)
+        if host:
+            return host
     if e.file_path:
         return e.file_path.rstrip("/").split("/")[-1]
     if e.window_title:
         return e.window_title[:80]
     return e.app_name or "Unknown"
 
-def _round_up_minutes(n: int, granularity: int) -> int:
-    return n if n % granularity == 0 else n + (granularity - (n % granularity))
+def _fk_name(obj) -> Optional[str]:
+    # plain attribute access on select_related rows; the getattr-with-default
+    # form paid for the fallback machinery on every row despite never needing it
+    return obj.name if obj is not None else None
+
+def _round_up_minutes(n: int, granularity: int = BLOCK_GRANULARITY) -> int:
+    # branchless ceiling division: one divmod instead of modulo + compare + add
+    return -(-n // granularity) * granularity
+
+def _parse_ts(ts: str) -> datetime:
+    """Parse an agent timestamp; raises ValidationError on garbage.
+
+    Agents emit ISO-8601 they produced themselves, so the C-implemented
+    fromisoformat handles virtually every payload; parse_datetime stays as
+    the fallback for RFC3339 variants it doesn't accept.
+    """
+    try:
+        if ts.endswith("Z"):
+            ts = ts[:-1] + "+00:00"
+        return datetime.fromisoformat(ts)
+    except ValueError:
+        dt = parse_datetime(ts)
+        if dt is None:
+            raise ValidationError({"ts_utc": f"Invalid ts_utc: {ts}"})
+        return dt
+
+
+def _json_response(data):
+    """Serialize an already-plain payload with orjson, skipping DRF rendering.
+
+    The UI endpoints build lists of dicts of primitives (plus datetimes,
+    which orjson serializes natively in C), so the renderer/encoder stack
+    adds nothing but per-row overhead on large days.
+    """
+    if orjson is None:
+        return Response(data)
+    return HttpResponse(orjson.dumps(data, default=str), content_type="application/json")
 
 # ------------------------------------------------------------------------------------
 # Health
@@ -91,79 +172,270 @@ class NoAuth(BaseAuthentication):
     def authenticate(self, request):
         return None
 
-@api_view(["POST"])
-@authentication_classes([NoAuth])          # no cookies/csrf
-@permission_classes([AgentKeyPermission])  # require Agent key header
-@throttle_classes([AnonRateThrottle])
-def raw_events(request):
+
+class OrjsonParser(JSONParser):
+    """Parse JSON bodies with orjson instead of stdlib json.loads.
+
+    Mounted only on the ingest endpoints, where agent batches are the
+    largest payloads the server sees; request.data is unchanged for
+    callers. Falls back to DRF's parser when orjson isn't installed.
     """
-    Ingest one or many RawEvent objects. Accepts dict or list[dict].
-    ts_utc may be ISO string or datetime; other fields per RawEventSerializer.
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+# RawEvent is flat scalars, so its ingest constraints are spelled out here
+# instead of run through RawEventSerializer: DRF's ListSerializer builds a
+# child serializer and coerces every field per row, which measures as a large
+# share of ingest CPU on big agent batches.
+_RAW_EVENT_TEXT_FIELDS = ("app_name", "bundle_id", "window_title", "url", "file_path", "user", "hostname")
+_RAW_EVENT_CHAR_FIELDS = frozenset({"app_name", "bundle_id", "user", "hostname"})  # max_length=255
+
+
+def _validate_raw_event(item):
+    """Return (row, errors) enforcing RawEventSerializer's constraints."""
+    if not isinstance(item, dict):
+        # same wording DRF's child serializer reports for non-dict items
+        return {}, {"non_field_errors": f"Invalid data. Expected a dictionary, but got {type(item).__name__}."}
+    errors: Dict[str, str] = {}
+    row: Dict[str, Any] = {}
+    ts = item.get("ts_utc")
+    if isinstance(ts, datetime):
+        row["ts_utc"] = ts
+    else:
+        errors["ts_utc"] = "This field is required and must be a datetime or ISO-8601 string."
+    for f in _RAW_EVENT_TEXT_FIELDS:
+        v = item.get(f)
+        if v is None:
+            row[f] = None
+        elif not isinstance(v, str):
+            errors[f] = "Not a valid string."
+        elif f in _RAW_EVENT_CHAR_FIELDS and len(v) > 255:
+            errors[f] = "Ensure this field has no more than 255 characters."
+        else:
+            row[f] = v
+    return row, errors
+
+
+def _ingest(request):
+    """Shared body for the ingest endpoints: normalize, validate, bulk-insert.
+
+    The three routes differ only in auth (agent key vs the dev-open
+    legacy endpoint), so they share one implementation instead of three
+    byte-for-byte copies.
     """
     payload = request.data
     if isinstance(payload, dict):
         payload = [payload]
     if not isinstance(payload, list):
         raise ValidationError("Payload must be an object or an array of objects.")
+    if not payload:
+        return Response({"created": 0}, status=status.HTTP_201_CREATED)
+    # batches often repeat second-resolution timestamps; parse each distinct
+    # string once per request
+    ts_cache: Dict[str, datetime] = {}
     for item in payload:
+        if not isinstance(item, dict):
+            continue  # _validate_raw_event reports these per item below
         ts = item.get("ts_utc")
         if isinstance(ts, str):
-            dt = parse_datetime(ts)
+            dt = ts_cache.get(ts)
             if dt is None:
-                raise ValidationError({"ts_utc": f"Invalid ts_utc: {ts}"})
+                dt = ts_cache[ts] = _parse_ts(ts)
             item["ts_utc"] = dt
-    ser = RawEventSerializer(data=payload, many=True)
-    ser.is_valid(raise_exception=True)
-    ser.save()
+
+    rows: List[Dict[str, Any]] = []
+    item_errors: List[Dict[str, str]] = []
+    invalid = False
+    for item in payload:
+        row, errors = _validate_raw_event(item)
+        if errors:
+            invalid = True
+        item_errors.append(errors)
+        rows.append(row)
+    if invalid:
+        # same shape DRF's many=True validation reports: one dict per item
+        raise ValidationError(item_errors)
+
+    # Hottest write path in the app: on Postgres, skip ORM instance
+    # construction and column coercion entirely and send one multi-row
+    # VALUES statement; elsewhere bulk_create still batches the INSERTs.
+    if execute_values is not None and connection.vendor == "postgresql":
+        values = [
+            (row["ts_utc"], row["app_name"], row["bundle_id"], row["window_title"],
+             row["url"], row["file_path"], row["user"], row["hostname"])
+            for row in rows
+        ]
+        with transaction.atomic(), connection.cursor() as cur:
+            execute_values(
+                cur,
+                'INSERT INTO tracker_rawevent'
+                ' (ts_utc, app_name, bundle_id, window_title, url, file_path, "user", hostname)'
+                ' VALUES %s ON CONFLICT DO NOTHING',
+                values, page_size=1000,
+            )
+    else:
+        # one INSERT per 500 rows instead of a per-object save()
+        with transaction.atomic():
+            RawEvent.objects.bulk_create(
+                [RawEvent(**row) for row in rows],
+                batch_size=500, ignore_conflicts=True,
+            )
+    _invalidate_compact_cache(payload)
     return Response({"created": len(payload)}, status=status.HTTP_201_CREATED)
 
+
+@api_view(["POST"])
+@authentication_classes([NoAuth])          # no cookies/csrf
+@permission_classes([AgentKeyPermission])  # require Agent key header
+@parser_classes([OrjsonParser])
+@throttle_classes([AnonRateThrottle])
+def raw_events(request):
+    """
+    Ingest one or many RawEvent objects. Accepts dict or list[dict].
+    ts_utc may be ISO string or datetime; other fields per RawEventSerializer.
+    """
+    return _ingest(request)
+
+
+@api_view(["POST"])
+@authentication_classes([NoAuth])
+@permission_classes([AgentKeyPermission])
+@parser_classes([OrjsonParser])
+@throttle_classes([AnonRateThrottle])
+def raw_events_bulk(request):
+    """
+    Batch ingest: accepts a JSON array of RawEvent objects and writes them
+    with a single bulk_create (one transaction, one round trip).
+    """
+    return _ingest(request)
+
+
 @api_view(["POST"])
 @permission_classes([AllowAny])            # dev/legacy open endpoint (lock down later)
+@parser_classes([OrjsonParser])
 @throttle_classes([AnonRateThrottle])
 def ingest_raw_event(request):
-    payload = request.data
-    if isinstance(payload, dict):
-        payload = [payload]
-    if not isinstance(payload, list):
-        raise ValidationError("Payload must be an object or an array of objects.")
-    for item in payload:
-        ts = item.get("ts_utc")
-        if isinstance(ts, str):
-            dt = parse_datetime(ts)
-            if dt is None:
-                raise ValidationError({"ts_utc": f"Invalid ts_utc: {ts}"})
-            item["ts_utc"] = dt
-    ser = RawEventSerializer(data=payload, many=True)
-    ser.is_valid(raise_exception=True)
-    ser.save()
-    return Response({"created": len(payload)}, status=status.HTTP_201_CREATED)
+    return _ingest(request)
 
 # ------------------------------------------------------------------------------------
 # Compactor: RawEvent -> Block (for TODAY only; compaction-on-read)
 # ------------------------------------------------------------------------------------
+# Sessionization in SQL: label each event, break groups on a >pad gap or a
+# label change via LAG() over (user, hostname), and INSERT ... SELECT the
+# grouped spans straight into Block. The whole day compacts in one statement
+# inside Postgres instead of materializing every RawEvent as an ORM object.
+_COMPACT_SQL = """
+WITH labeled AS (
+    SELECT ts_utc,
+           COALESCE(NULLIF("user", ''), %(default_user)s)   AS usr,
+           COALESCE(NULLIF(hostname, ''), %(default_host)s) AS host,
+           COALESCE(url, '')        AS url,
+           COALESCE(file_path, '')  AS file_path,
+           CASE
+             WHEN COALESCE(url, '') <> ''
+               -- keep in lockstep with _host_from_url: strip the scheme, cut
+               -- at the first of ?/#//, drop the port, lowercase
+               THEN lower(split_part(split_part(split_part(split_part(
+                        regexp_replace(url, '^[a-z][a-z0-9+.-]*://', '', 'i'),
+                        '?', 1), '#', 1), '/', 1), ':', 1))
+             WHEN COALESCE(file_path, '') <> ''
+               THEN reverse(split_part(reverse(rtrim(file_path, '/')), '/', 1))
+             WHEN COALESCE(window_title, '') <> ''
+               THEN left(window_title, 80)
+             ELSE COALESCE(NULLIF(app_name, ''), 'Unknown')
+           END AS label
+    FROM tracker_rawevent
+    WHERE ts_utc >= %(start)s
+      AND (%(user)s IS NULL OR "user" = %(user)s)
+      AND (%(hostname)s IS NULL OR hostname = %(hostname)s)
+),
+marked AS (
+    SELECT *,
+           CASE WHEN lag(ts_utc) OVER w IS NULL
+                  OR ts_utc - lag(ts_utc) OVER w > %(pad)s * interval '1 minute'
+                  OR label IS DISTINCT FROM lag(label) OVER w
+                THEN 1 ELSE 0 END AS new_grp
+    FROM labeled
+    WINDOW w AS (PARTITION BY usr, host ORDER BY ts_utc)
+),
+grouped AS (
+    SELECT *, sum(new_grp) OVER (PARTITION BY usr, host ORDER BY ts_utc) AS grp
+    FROM marked
+)
+INSERT INTO tracker_block
+    (org_id, "user", hostname, start, "end", title, url, file_path, notes, locked)
+SELECT %(org_id)s, usr, host, min(ts_utc), max(ts_utc), max(label),
+       (array_agg(url ORDER BY ts_utc))[1],
+       (array_agg(file_path ORDER BY ts_utc))[1],
+       '', false
+FROM grouped
+GROUP BY usr, host, grp
+"""
+
+
+def _default_org():
+    # Resolved once per compaction (not lru_cached): get_or_create may run
+    # inside compact's transaction, and a rollback would leave a cached Group
+    # whose row no longer exists.
+    from django.contrib.auth.models import Group
+    default_org, _ = Group.objects.get_or_create(name="default-org", defaults={})
+    return default_org
+
+
 @transaction.atomic
 def compact_rawevents_into_blocks(user: Optional[str] = None, hostname: Optional[str] = None, org=None) -> int:
     start_utc = _start_of_local_day_utc()
-    ev_qs = RawEvent.objects.filter(ts_utc__gte=start_utc).order_by("ts_utc")
-    if user:
-        ev_qs = ev_qs.filter(user=user)
-    if hostname:
-        ev_qs = ev_qs.filter(hostname=hostname)
-    events: List[RawEvent] = list(ev_qs)
 
     # wipe today's blocks (scoped)
     blk_qs = Block.objects.filter(start__gte=start_utc)
-    if hasattr(Block, "user") and user:
+    if BLOCK_HAS_USER and user:
         blk_qs = blk_qs.filter(user=user)
-    if hasattr(Block, "hostname") and hostname:
+    if BLOCK_HAS_HOSTNAME and hostname:
         blk_qs = blk_qs.filter(hostname=hostname)
     blk_qs.delete()
 
-    created = 0
+    if connection.vendor == "postgresql":
+        if org is None:
+            org = _default_org()
+        with connection.cursor() as cursor:
+            cursor.execute(_COMPACT_SQL, {
+                "start": start_utc,
+                "user": user,
+                "hostname": hostname,
+                "default_user": DEFAULT_USER,
+                "default_host": DEFAULT_HOST,
+                "pad": BLOCK_PAD_MINUTES,
+                "org_id": org.id,
+            })
+            return cursor.rowcount
+
+    # Fallback: Python sessionization (non-Postgres backends, e.g. tests)
+    ev_qs = RawEvent.objects.filter(ts_utc__gte=start_utc).order_by("ts_utc")
+    if user:
+        ev_qs = ev_qs.filter(user=user)
+    if hostname:
+        ev_qs = ev_qs.filter(hostname=hostname)
+    # named tuples straight from the driver: no RawEvent hydration or field
+    # descriptors for rows we only read a handful of columns from
+    events = list(ev_qs.values_list(
+        "ts_utc", "url", "file_path", "window_title", "app_name", "user", "hostname",
+        named=True,
+    ))
+
+    # Resolve the default org once per invocation; finalize_and_create used
+    # to issue a Group.get_or_create SELECT for every block it wrote.
+    if BLOCK_ORG_REQUIRED and org is None:
+        org = _default_org()
+
+    new_blocks: List[Block] = []
     pad = timedelta(minutes=BLOCK_PAD_MINUTES)
-    current: Optional[Dict[str, Any]] = None
 
-    def finalize_and_create(cur: Dict[str, Any]) -> int:
+    def finalize_and_create(cur: Dict[str, Any]) -> None:
         dur = int((cur["end"] - cur["start"]).total_seconds() // 60)
         dur = max(MIN_BLOCK_DURATION, _round_up_minutes(dur, BLOCK_GRANULARITY))
 
@@ -176,73 +448,137 @@ def compact_rawevents_into_blocks(user: Optional[str] = None, hostname: Optional
         )
 
         # Always provide defaults if your Block has NOT NULL constraints
-        if hasattr(Block, "user"):
+        if BLOCK_HAS_USER:
             kwargs["user"] = (cur.get("user") or DEFAULT_USER)
-        if hasattr(Block, "hostname"):
+        if BLOCK_HAS_HOSTNAME:
             kwargs["hostname"] = (cur.get("hostname") or DEFAULT_HOST)
-        if hasattr(Block, "minutes"):
+        if BLOCK_HAS_MINUTES:
             kwargs["minutes"] = dur
 
-        # Set org field if it exists on the Block model
-        if any(f.name == "org" for f in Block._meta.fields):
-            field = Block._meta.get_field("org")
-            # If org is required but not provided, we need a default
-            if not field.null:
-                if org is None:
-                    from django.contrib.auth.models import Group
-                    # Try to get or create a default org
-                    default_org, created = Group.objects.get_or_create(
-                        name="default-org",
-                        defaults={}
-                    )
-                    kwargs["org"] = default_org
-                else:
-                    kwargs["org"] = org
-            else:
-                # org is nullable, so None is fine
-                kwargs["org"] = org
-
-        Block.objects.create(**kwargs)
-        return 1
+        if BLOCK_HAS_ORG:
+            # resolved once before the loop; None is fine when org is nullable
+            kwargs["org"] = org
+
+        # collected here, written as one bulk INSERT after the loop
+        new_blocks.append(Block(**kwargs))
 
 
+    # Consecutive events overwhelmingly repeat the same source fields, so
+    # label work is memoized per distinct tuple rather than run per event.
+    label_cache: Dict[tuple, str] = {}
+    labels: List[str] = []
     for e in events:
-        lbl = _label_from_event(e)
-        if current is None:
-            u = user or getattr(e, "user", None) or DEFAULT_USER
-            h = hostname or getattr(e, "hostname", None) or DEFAULT_HOST
-            current = dict(
-                start=e.ts_utc,
-                end=e.ts_utc,
-                title=lbl,
-                url=e.url or "",
-                file_path=e.file_path or "",
-                user=u,
-                hostname=h,
-            )
+        lkey = (e.url, e.file_path, e.window_title, e.app_name)
+        lbl = label_cache.get(lkey)
+        if lbl is None:
+            lbl = label_cache[lkey] = _label_from_event(e)
+        labels.append(lbl)
+
+    # Session breaks are a pure function of consecutive (ts, label) pairs.
+    # With numpy available, gap and label-change detection run as two
+    # vectorized comparisons over the whole day; without it, the same test
+    # runs per event. Either way only group boundaries reach Python below.
+    n = len(events)
+    if np is not None and n > 1:
+        ts = np.fromiter((e.ts_utc.timestamp() for e in events), dtype=np.float64, count=n)
+        code: Dict[str, int] = {}
+        lab = np.fromiter((code.setdefault(l, len(code)) for l in labels), dtype=np.int64, count=n)
+        brk = np.flatnonzero((np.diff(ts) > pad.total_seconds()) | (lab[1:] != lab[:-1])) + 1
+        starts = [0, *brk.tolist()]
+    else:
+        starts = [0] if n else []
+        for i in range(1, n):
+            if events[i].ts_utc - events[i - 1].ts_utc > pad or labels[i] != labels[i - 1]:
+                starts.append(i)
+
+    for s, t in zip(starts, starts[1:] + [n]):
+        first, last = events[s], events[t - 1]
+        finalize_and_create(dict(
+            start=first.ts_utc,
+            end=last.ts_utc,
+            title=labels[s],
+            url=first.url or "",
+            file_path=first.file_path or "",
+            user=user or getattr(first, "user", None) or DEFAULT_USER,
+            hostname=hostname or getattr(first, "hostname", None) or DEFAULT_HOST,
+        ))
+
+    Block.objects.bulk_create(new_blocks, batch_size=500)
+    return len(new_blocks)
+
+
+def _compact_cache_key(user: Optional[str], hostname: Optional[str], day) -> str:
+    return f"compact:{user}:{hostname}:{day}"
+
+
+def _compact_if_dirty(user: Optional[str] = None, hostname: Optional[str] = None, org=None) -> int:
+    """Run the compactor only when the scope has new raw events.
+
+    The UI polls these endpoints, and each poll used to wipe and rebuild
+    today's blocks unconditionally. Comparing max(ts_utc) for the scope
+    against the value recorded after the last compaction turns an idle
+    poll into a single indexed SELECT.
+    """
+    start_utc = _start_of_local_day_utc()
+    ev_qs = RawEvent.objects.filter(ts_utc__gte=start_utc)
+    if user:
+        ev_qs = ev_qs.filter(user=user)
+    if hostname:
+        ev_qs = ev_qs.filter(hostname=hostname)
+    latest = ev_qs.aggregate(m=Max("ts_utc"))["m"]
 
+    key = _compact_cache_key(user, hostname, timezone.localdate())
+    if latest is not None and cache.get(key) == latest:
+        return 0
 
-        gap = e.ts_utc - current["end"]
-        if gap <= pad and lbl == current["title"]:
-            current["end"] = e.ts_utc
-        else:
-            created += finalize_and_create(current)
-            u = user or getattr(e, "user", None) or DEFAULT_USER
-            h = hostname or getattr(e, "hostname", None) or DEFAULT_HOST
-            current = dict(
-                start=e.ts_utc,
-                end=e.ts_utc,
-                title=lbl,
-                url=e.url or "",
-                file_path=e.file_path or "",
-                user=u,
-                hostname=h,
-            )
+    created = compact_rawevents_into_blocks(user=user, hostname=hostname, org=org)
+    if latest is not None:
+        cache.set(key, latest, 3600)
+    return created
 
-    if current:
-        created += finalize_and_create(current)
 
-    return created
+def _active_rules(org) -> List[Rule]:
+    """Active rules for a scope, cached until any Rule changes.
+
+    Both UI endpoints hit this once per poll; a version counter bumped by
+    the signal below keys the cache, so edits in the admin (or a rule
+    created from label_block) take effect on the next request without a
+    TTL wait.
+    """
+    org_id = org.id if org is not None else None
+    key = f"rules:{org_id}:{cache.get('rules-ver', 0)}"
+    rules = cache.get(key)
+    if rules is None:
+        qs = Rule.objects.filter(active=True, org=org) if org else Rule.objects.filter(active=True)
+        rules = list(qs)
+        cache.set(key, rules, 300)
+    return rules
+
+
+@receiver(post_save, sender=Rule)
+@receiver(post_delete, sender=Rule)
+def _bump_rules_version(sender, **kwargs):
+    try:
+        cache.incr("rules-ver")
+    except ValueError:
+        cache.set("rules-ver", 1, None)
+
+
+def _invalidate_compact_cache(payload: List[Dict[str, Any]]) -> None:
+    """Drop compaction markers for every scope an ingested batch can touch.
+
+    Belt-and-braces for late-arriving events whose ts_utc doesn't move
+    max(ts_utc) forward; the next poll then recompacts.
+    """
+    day = timezone.localdate()
+    keys = {_compact_cache_key(None, None, day)}
+    for item in payload:
+        u = item.get("user") or None
+        h = item.get("hostname") or None
+        keys.add(_compact_cache_key(u, h, day))
+        keys.add(_compact_cache_key(u, None, day))
+        keys.add(_compact_cache_key(None, h, day))
+    cache.delete_many(list(keys))
 
 
 # ------------------------------------------------------------------------------------
@@ -259,37 +595,47 @@ def blocks_today(request):
     hostname = request.GET.get("hostname") or None
     org = request.user.groups.first() if (USE_AUTH and request.user.is_authenticated) else None
 
-    compact_rawevents_into_blocks(user=user, hostname=hostname, org=org)
+    _compact_if_dirty(user=user, hostname=hostname, org=org)
 
     start_utc = _start_of_local_day_utc()
     qs = Block.objects.filter(start__gte=start_utc).order_by("start")
-    if hasattr(Block, "user") and user:
+    if BLOCK_HAS_USER and user:
         qs = qs.filter(user=user)
-    if hasattr(Block, "hostname") and hostname:
+    if BLOCK_HAS_HOSTNAME and hostname:
         qs = qs.filter(hostname=hostname)
 
-    def minutes(b: Block) -> int:
-        if hasattr(b, "minutes") and b.minutes is not None:
-            return int(b.minutes)
-        return int((b.end - b.start).total_seconds() / 60)
-
-    data = [
-        {
-            "id": b.id,
-            "start": b.start,
-            "end": b.end,
-            "minutes": minutes(b),
-            "title": b.title,
-            "url": b.url,
-            "file_path": b.file_path,
-            "client": getattr(b.client, "name", None),
-            "project": getattr(b.project, "name", None),
-            "task": getattr(b.task, "name", None),
-            "notes": getattr(b, "notes", "") or "",
-        }
-        for b in qs
+    # values() returns dicts straight from the driver (the __name paths become
+    # LEFT JOINs), skipping Block.__init__ and field descriptors per row.
+    fields = [
+        "id", "start", "end", "title", "url", "file_path",
+        "client__name", "project__name", "task__name", "notes",
     ]
-    return Response(data)
+    if BLOCK_HAS_MINUTES:
+        fields.append("minutes")
+    else:
+        # subtraction happens in SQL; Python just reads the returned duration
+        qs = qs.annotate(duration=_DURATION_EXPR)
+        fields.append("duration")
+
+    data = []
+    for r in qs.values(*fields):
+        mins = r.get("minutes")
+        if mins is None:
+            mins = int(r["duration"].total_seconds() // 60)
+        data.append({
+            "id": r["id"],
+            "start": r["start"],
+            "end": r["end"],
+            "minutes": int(mins),
+            "title": r["title"],
+            "url": r["url"],
+            "file_path": r["file_path"],
+            "client": r["client__name"],
+            "project": r["project__name"],
+            "task": r["task__name"],
+            "notes": r["notes"] or "",
+        })
+    return _json_response(data)
 
 @api_view(["GET"])
 @permission_classes([PermUI])
@@ -302,43 +648,58 @@ def suggestions_today(request):
     hostname = request.GET.get("hostname") or None
     org = request.user.groups.first() if (USE_AUTH and request.user.is_authenticated) else None
 
-    compact_rawevents_into_blocks(user=user, hostname=hostname, org=org)
+    _compact_if_dirty(user=user, hostname=hostname, org=org)
 
     start_utc = _start_of_local_day_utc()
-    qs = Block.objects.filter(start__gte=start_utc).order_by("start")
-    if hasattr(Block, "user") and user:
+    # join client/project/task up front; the per-row name reads below would
+    # otherwise each cost a query
+    qs = (
+        Block.objects.select_related("client", "project", "task")
+        .filter(start__gte=start_utc)
+        .annotate(duration=_DURATION_EXPR)
+        .order_by("start")
+    )
+    if BLOCK_HAS_USER and user:
         qs = qs.filter(user=user)
-    if hasattr(Block, "hostname") and hostname:
+    if BLOCK_HAS_HOSTNAME and hostname:
         qs = qs.filter(hostname=hostname)
 
-    rules = list(Rule.objects.filter(active=True, org=org)) if org else list(Rule.objects.filter(active=True))
+    rules = _active_rules(org)
 
     out = []
+    blocks = list(qs)
     with transaction.atomic():
-        for b in qs:
-            Suggestion.objects.filter(block=b).delete()
-            for field, value_text, conf in list(apply_rules(b, rules))[:3]:
-                Suggestion.objects.create(
+        # one DELETE + one bulk INSERT instead of a delete/create pair per block
+        Suggestion.objects.filter(block_id__in=[b.id for b in blocks]).delete()
+        to_create = []
+        for b in blocks:
+            # every rule emits the same base confidence, so the first three
+            # matches are the top three; islice stops the rule scan right there
+            top = list(islice(apply_rules(b, rules), 3))
+            for field, value_text, conf in top:
+                to_create.append(Suggestion(
                     block=b, label_type=field, value_text=value_text,
                     confidence=conf, source="rule"
-                )
+                ))
             out.append({
                 "id": b.id,
                 "start": b.start,
                 "end": b.end,
-                "minutes": int((b.end - b.start).total_seconds() / 60),
+                "minutes": int(b.duration.total_seconds() // 60),
                 "title": b.title,
                 "url": b.url,
                 "file_path": b.file_path,
-                "client": getattr(b.client, "name", None),
-                "project": getattr(b.project, "name", None),
-                "task": getattr(b.task, "name", None),
+                "client": _fk_name(b.client),
+                "project": _fk_name(b.project),
+                "task": _fk_name(b.task),
+                # built from the in-memory tuples; no per-block re-query
                 "suggestions": [
-                    {"label_type": s.label_type, "value_text": s.value_text, "confidence": s.confidence}
-                    for s in b.suggestions.all().order_by("-confidence")[:3]
+                    {"label_type": field, "value_text": value_text, "confidence": conf}
+                    for field, value_text, conf in top
                 ],
             })
-    return Response(out)
+        Suggestion.objects.bulk_create(to_create, batch_size=1000)
+    return _json_response(out)
 
 @api_view(["POST"])
 @permission_classes([PermUI])
@@ -350,19 +711,26 @@ def label_block(request):
     if not block_id:
         raise ValidationError({"block_id": "Required."})
     try:
-        b = Block.objects.select_related("org").get(id=block_id) if hasattr(Block, "org") \
-            else Block.objects.get(id=block_id)
+        b = Block.objects.get(id=block_id)
     except Block.DoesNotExist:
         raise NotFound("Block not found.")
 
-    # Mutations
+    # Mutations: resolve each named FK to its id only — .only("id") keeps the
+    # SELECT to one column and assigning <field>_id skips hydrating an object
+    # we never read. Scoping by b.org_id also drops the select_related("org")
+    # the old b.org reads required.
     get = request.data.get
+    def _fk_id(model, name):
+        qs = model.objects.only("id")
+        obj = qs.get(org_id=b.org_id, name=name) if BLOCK_HAS_ORG else qs.get(name=name)
+        return obj.id
+
     if (v := get("client")):
-        b.client = Client.objects.get(org=b.org, name=v) if hasattr(b, "org") else Client.objects.get(name=v)
+        b.client_id = _fk_id(Client, v)
     if (v := get("project")):
-        b.project = Project.objects.get(org=b.org, name=v) if hasattr(b, "org") else Project.objects.get(name=v)
+        b.project_id = _fk_id(Project, v)
     if (v := get("task")):
-        b.task = Task.objects.get(org=b.org, name=v) if hasattr(b, "org") else Task.objects.get(name=v)
+        b.task_id = _fk_id(Task, v)
     if (v := get("notes")) is not None:
         b.notes = v
     b.save()
@@ -376,7 +744,7 @@ def label_block(request):
             raise ValidationError({"create_rule_value": "Required when create_rule is true."})
         pattern = get("pattern") or (b.url or b.file_path or (b.title or ""))[:200]
         Rule.objects.create(
-            org=b.org if hasattr(b, "org") else None,
+            org_id=b.org_id if BLOCK_HAS_ORG else None,
             pattern=pattern,
             field=field,
             value_text=value_text,